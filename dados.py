@@ -9,6 +9,15 @@ CHANGELOG V18 (FINAL):
 - [SCI] Stats: Baseline MAD com 'Shift(1)' para evitar contaminação pelo dado presente (Look-ahead bias).
 - [SCI] Text: Remoção de alegações de causalidade; adoção de "Associação Temporal".
 - [SCI] Metric: KSU definido explicitamente como Proxy de Demanda Relativa.
+
+CHANGELOG V18.1 (PERFORMANCE):
+- [PERF] Math: Média móvel calculada em uma única chamada rolling; retorna só as colunas '_smooth'.
+- [PERF] Stats: MAD rolling exato vetorizado (sliding_window_view) no lugar do lambda por janela.
+- [PERF] Lag: Correlação de todos os lags em uma operação matricial; pearsonr só no lag vencedor.
+- [PERF] Cache: Pipeline pós-coleta em @st.cache_data (mesmo df_raw = resultado instantâneo).
+- [PERF] Net: Cliente TrendReq reaproveitado via @st.cache_resource (sem novo handshake de cookies).
+- [PERF] Viz: Eixo X em ISO calculado uma vez e séries float32 nos traces (payload JSON menor).
+- [PERF] Export: Bytes do CSV de auditoria cacheados (não reserializa a cada reexecução).
 """
 
 import streamlit as st
@@ -17,7 +26,12 @@ import numpy as np
 from pytrends.request import TrendReq
 from scipy.stats import pearsonr
 import plotly.graph_objects as go
+import io
 import time
+import threading
+import re
+from types import MappingProxyType
+from numpy.lib.stride_tricks import sliding_window_view
 from datetime import datetime, timedelta
 
 # ==============================================================================
@@ -32,7 +46,7 @@ st.set_page_config(
 )
 
 # Dados Demográficos (IBGE)
-POPULACAO_UF = {
+POPULACAO_UF = MappingProxyType({
     'BR-SP': 44411238, 'BR-MG': 21411923, 'BR-RJ': 17463349, 'BR-BA': 14985284,
     'BR-PR': 11597484, 'BR-RS': 11466630, 'BR-PE': 9674793, 'BR-CE': 9240580,
     'BR-PA': 8777124, 'BR-SC': 7338473, 'BR-GO': 7206589, 'BR-MA': 7153262,
@@ -40,10 +54,10 @@ POPULACAO_UF = {
     'BR-RN': 3560903, 'BR-AL': 3365351, 'BR-PI': 3289290, 'BR-DF': 3094325,
     'BR-MS': 2839188, 'BR-SE': 2338474, 'BR-RO': 1815278, 'BR-TO': 1607363,
     'BR-AC': 906876, 'BR-AP': 877613, 'BR-RR': 652713
-}
+})
 
 # Estimativa de Penetração de Internet (PNAD)
-PENETRACAO_INTERNET = {
+PENETRACAO_INTERNET = MappingProxyType({
     'BR-DF': 0.92, 'BR-SP': 0.88, 'BR-RJ': 0.86, 'BR-SC': 0.85,
     'BR-PR': 0.84, 'BR-RS': 0.83, 'BR-GO': 0.82, 'BR-MS': 0.81,
     'BR-MG': 0.80, 'BR-ES': 0.79, 'BR-MT': 0.78, 'BR-RO': 0.75,
@@ -51,7 +65,12 @@ PENETRACAO_INTERNET = {
     'BR-CE': 0.67, 'BR-PE': 0.66, 'BR-PB': 0.65, 'BR-PA': 0.62,
     'BR-AM': 0.61, 'BR-AP': 0.60, 'BR-RR': 0.59, 'BR-MA': 0.58,
     'BR-AL': 0.57, 'BR-PI': 0.56, 'BR-AC': 0.55
-}
+})
+
+# População conectada pré-calculada (evita duas buscas + multiplicação a cada chamada)
+POP_CONECTADA_UF = MappingProxyType(
+    {uf: pop * PENETRACAO_INTERNET.get(uf, 0.70) for uf, pop in POPULACAO_UF.items()}
+)
 
 # Cores
 C_ALVO = '#2980b9'
@@ -64,48 +83,71 @@ C_FILL = 'rgba(231, 76, 60, 0.3)'
 class MockDataGenerator:
     """Gera dados sintéticos com seed fixa para reprodutibilidade."""
     @staticmethod
-    def gerar_curva_epidemiologica(dias=90, intensidade=1.0, seed=42):
-        np.random.seed(seed)
+    def gerar_curva_epidemiologica(dias=90, intensidade=1.0, seed=42, rng=None):
+        # Generator local: não altera o estado global do numpy
+        rng = rng if rng is not None else np.random.default_rng(seed)
         x = np.linspace(0, 10, dias)
         surto = 100 * (1 / (1 + np.exp(-(x - 5)*2))) * np.exp(-(x - 5)*0.2)
         baseline = 10 + 5 * np.sin(x)
-        ruido = np.random.normal(0, 3, dias)
+        ruido = rng.normal(0, 3, dias)
         y = (baseline + (surto * intensidade) + ruido)
-        return np.clip(y, 0, 100)
+        # Escores 0-100: float32 basta e reduz pela metade o tráfego de memória
+        return np.clip(y, 0, 100).astype(np.float32)
 
     @staticmethod
-    def criar_dataset_simulado(termos):
-        dates = pd.date_range(end=datetime.today(), periods=90)
-        data = {}
-        data[termos[0]] = MockDataGenerator.gerar_curva_epidemiologica(seed=42)
-        raw_sintoma = MockDataGenerator.gerar_curva_epidemiologica(seed=42)
-        data[termos[1]] = np.roll(raw_sintoma, -5) * 0.9 
-        raw_remedio = MockDataGenerator.gerar_curva_epidemiologica(seed=42)
-        data[termos[2]] = np.roll(raw_remedio, 2) * 0.7
-        np.random.seed(99)
-        data[termos[3]] = np.clip(data[termos[0]] * np.random.uniform(0.5, 1.5, 90), 0, 100)
-        np.random.seed(101)
-        data[termos[4]] = np.random.normal(30, 5, 90)
-        return pd.DataFrame(data, index=dates)
+    def criar_dataset_simulado(termos, dias=90):
+        dates = pd.date_range(end=datetime.today(), periods=dias)
+        # Um único Generator (seed 42) para todo o dataset: reprodutível e sem estado global
+        rng = np.random.default_rng(42)
+        # Curva base calculada uma única vez (as três séries derivadas usavam a mesma seed)
+        base = MockDataGenerator.gerar_curva_epidemiologica(dias=dias, rng=rng)
+        arr = np.empty((dias, 5), dtype=np.float32, order='F')
+        arr[:, 0] = base
+        arr[:, 1] = np.roll(base, -5) * 0.9
+        arr[:, 2] = np.roll(base, 2) * 0.7
+        arr[:, 3] = np.clip(base * rng.uniform(0.5, 1.5, dias), 0, 100)
+        arr[:, 4] = rng.normal(30, 5, dias)
+        return pd.DataFrame(arr, index=dates, columns=list(termos[:5]), copy=False)
 
 # ==============================================================================
 # 3. MÓDULO DE CONEXÃO
 # ==============================================================================
 class TrendMiningAgent:
+    RE_ESPACOS = re.compile(r'\s+')
+
     def __init__(self):
         self.hl = 'pt-BR'
         self.tz = 180 # UTC-3
 
+    @staticmethod
+    def normalizar_termo(termo):
+        """Forma canônica do termo (espaços colapsados, minúsculas) usada como chave de cache."""
+        return TrendMiningAgent.RE_ESPACOS.sub(' ', termo).strip().lower()
+
+    @st.cache_resource(ttl=3600, show_spinner=False)
+    def obter_cliente(_self, hl, tz):
+        """
+        Cliente pytrends compartilhado entre reexecuções (o construtor faz a busca de cookies).
+        O TrendReq guarda o estado da consulta (build_payload -> interest_over_time), por isso
+        vem acompanhado de um Lock; o ttl renova os cookies periodicamente.
+        """
+        return TrendReq(hl=hl, tz=tz), threading.Lock()
+
     @st.cache_data(ttl=3600, show_spinner=False)
     def buscar_dados(_self, termos, geo, timeframe):
-        pytrends = TrendReq(hl=_self.hl, tz=_self.tz)
+        pytrends, lock = _self.obter_cliente(_self.hl, _self.tz)
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                pytrends.build_payload(termos, geo=geo, timeframe=timeframe)
-                df = pytrends.interest_over_time()
+                # Sessões rodam em threads paralelas: payload e leitura não podem se intercalar
+                with lock:
+                    pytrends.build_payload(list(termos), geo=geo, timeframe=timeframe)
+                    df = pytrends.interest_over_time()
                 if not df.empty:
-                    return df.drop(columns=['isPartial'], errors='ignore'), False
+                    if 'isPartial' in df.columns:
+                        del df['isPartial']
+                    # Escores do Trends são inteiros 0-100: int8 reduz o DataFrame em cache a 1/8
+                    return df.astype(np.int8), False
             except Exception as e:
                 time.sleep(2 ** attempt)
         return MockDataGenerator.criar_dataset_simulado(termos), True
@@ -124,11 +166,12 @@ class EpidemiologicalMath:
 
     @staticmethod
     def aplicar_media_movel_retrospectiva(df, janela):
-        """Suavização 'Honesta': center=False"""
-        df_smooth = df.copy()
-        for col in df.columns:
-            df_smooth[f'{col}_smooth'] = df[col].rolling(window=janela, center=False, min_periods=1).mean()
-        return df_smooth
+        """
+        Suavização 'Honesta': center=False (uma única passada rolling para todas as colunas).
+        Retorna apenas as colunas '{col}_smooth'; as séries brutas continuam em df.
+        """
+        df_float = df.astype(np.float64)
+        return df_float.rolling(window=janela, center=False, min_periods=1).mean().add_suffix('_smooth')
 
     @staticmethod
     def calcular_limiar_robusto_mad(serie, janela):
@@ -143,9 +186,13 @@ class EpidemiologicalMath:
         # Agora calculamos sobre a série deslocada
         roll_median = serie_shifted.rolling(window=janela*2, center=False, min_periods=1).median()
         
-        roll_mad = serie_shifted.rolling(window=janela*2, center=False, min_periods=1).apply(
-            lambda x: np.median(np.abs(x - np.median(x)))
-        )
+        # MAD exato e vetorizado: uma janela por linha (sliding_window_view), sem callback Python.
+        # Janelas que contêm NaN (aquecimento) resultam em NaN, como no lambda original.
+        w = janela * 2
+        arr = serie_shifted.to_numpy(dtype=np.float64)
+        janelas = sliding_window_view(np.concatenate([np.full(w - 1, np.nan), arr]), w)
+        med = np.median(janelas, axis=1)
+        roll_mad = pd.Series(np.median(np.abs(janelas - med[:, None]), axis=1), index=serie.index)
         
         # Limiar = Mediana + 3 * MAD (Equivalente a 3 Sigmas)
         # Usamos 1.4826 como fator de consistência para distribuição normal
@@ -156,29 +203,62 @@ class EpidemiologicalMath:
     @staticmethod
     def calcular_detrended_lag_significancia(alvo, preditor, max_lag=14):
         """Lead-Time Detrended com P-Valor"""
-        d_alvo = alvo.diff().fillna(0)
-        d_preditor = preditor.diff().fillna(0)
+        d_alvo = alvo.diff().fillna(0).to_numpy(dtype=np.float64)
+        d_preditor = preditor.diff().fillna(0).to_numpy(dtype=np.float64)
+        n = len(d_alvo)
         
         best_lag = 0
         best_corr = -1.0
         best_p_value = 1.0
         
-        for lag in range(1, max_lag + 1):
-            d_pred_shifted = d_preditor.shift(lag).fillna(0)
-            try:
-                corr, p_val = pearsonr(d_alvo, d_pred_shifted)
-                if not np.isnan(corr) and corr > best_corr:
-                    best_corr = corr
-                    best_lag = lag
-                    best_p_value = p_val
-            except:
-                continue
+        # Matriz de defasagens (linha k-1 = preditor deslocado k dias, zeros no início),
+        # equivalente a shift(k).fillna(0) para todos os lags de uma só vez.
+        padded = np.concatenate([np.zeros(max_lag), d_preditor])
+        lagged = sliding_window_view(padded, n)[max_lag - 1::-1]
+        
+        # Pearson de todos os lags em uma passada vetorizada
+        a = d_alvo - d_alvo.mean()
+        P = lagged - lagged.mean(axis=1, keepdims=True)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corrs = (P @ a) / np.sqrt((P * P).sum(axis=1) * (a @ a))
+        
+        valid = ~np.isnan(corrs) & (corrs > best_corr)
+        if valid.any():
+            idx = int(np.argmax(np.where(valid, corrs, -np.inf)))
+            best_lag = idx + 1
+            # P-valor calculado apenas uma vez, no lag vencedor
+            best_corr, best_p_value = pearsonr(d_alvo, lagged[idx])
         return best_lag, best_corr, best_p_value
 
     @staticmethod
     def calcular_vero_index_robusto(clinico, ruido, controle):
         return clinico / ((ruido * 0.5) + (controle * 0.5) + 0.1)
 
+    @st.cache_data(ttl=3600, show_spinner=False)
+    def executar_pipeline(_self, df_raw, termos, janela):
+        """Pipeline pós-coleta (suavização, limiar, lag, Vero-Index), cacheado pelo conteúdo de df_raw."""
+        df_smooth = _self.aplicar_media_movel_retrospectiva(df_raw, janela=janela)
+        
+        # Baseline Robusto (Shifted)
+        threshold, _ = _self.calcular_limiar_robusto_mad(df_raw[termos[0]], janela)
+        df_smooth['threshold'] = threshold
+        
+        # Lag
+        lag_dias, lag_corr, p_val = _self.calcular_detrended_lag_significancia(df_raw[termos[0]], df_raw[termos[1]])
+        
+        # Vero-Index (última linha extraída uma única vez)
+        ultimo = df_smooth.iloc[-1]
+        vero_idx = _self.calcular_vero_index_robusto(
+            ultimo[f"{termos[1]}_smooth"],
+            ultimo[f"{termos[3]}_smooth"],
+            ultimo[f"{termos[4]}_smooth"]
+        )
+        return {
+            'df_smooth': df_smooth,
+            'lag_dias': lag_dias, 'lag_corr': lag_corr, 'p_val': p_val,
+            'vero_idx': vero_idx
+        }
+
 # ==============================================================================
 # 5. MÓDULO DEMOGRÁFICO
 # ==============================================================================
@@ -186,15 +266,26 @@ class DemographicAdjuster:
     @staticmethod
     def calcular_impacto_proxy(valor_relativo, uf_code):
         """Impacto normalizado KSU (Proxy de Demanda)"""
-        pop = POPULACAO_UF.get(uf_code, 1000000)
-        penetracao = PENETRACAO_INTERNET.get(uf_code, 0.70)
-        pop_conectada = pop * penetracao
+        pop_conectada = POP_CONECTADA_UF.get(uf_code, 1000000 * 0.70)
         # Normalização por 100k usuários conectados
         score_ksu = (valor_relativo / 100) * (pop_conectada / 100000)
         return score_ksu, pop_conectada
 
 # ==============================================================================
-# 6. FRONTEND (STREAMLIT)
+# 6. MÓDULO DE AUDITORIA (EXPORTAÇÃO)
+# ==============================================================================
+class AuditExporter:
+    @staticmethod
+    @st.cache_data(ttl=3600, show_spinner=False)
+    def gerar_csv(df):
+        """CSV de auditoria cacheado: só é serializado de novo quando df muda."""
+        # Escrita direta em buffer binário: evita a cópia intermediária str -> bytes
+        buf = io.BytesIO()
+        df.to_csv(buf, encoding='utf-8')
+        return buf.getvalue()
+
+# ==============================================================================
+# 7. FRONTEND (STREAMLIT)
 # ==============================================================================
 
 # --- Sidebar ---
@@ -203,7 +294,7 @@ st.sidebar.caption("v18.0 Academic Peer-Review")
 st.sidebar.markdown("---")
 
 raw_doenca = st.sidebar.text_input("Termo Sentinela:", value="Dengue")
-input_doenca = raw_doenca.strip()
+input_doenca = TrendMiningAgent.normalizar_termo(raw_doenca)
 input_uf = st.sidebar.selectbox("Jurisdição:", options=list(POPULACAO_UF.keys()))
 
 st.sidebar.markdown("### ⚙️ Parâmetros")
@@ -218,13 +309,14 @@ if st.button("🔎 INICIAR PROTOCOLO SENTINELA", type="primary"):
     math = EpidemiologicalMath()
     demo = DemographicAdjuster()
     
-    termos = [
+    # Tupla: chave de cache imutável para buscar_dados / executar_pipeline
+    termos = (
         input_doenca,                        
         f"sintomas {input_doenca}",          
         f"remedio {input_doenca}",           
         f"noticia {input_doenca}",           
         "previsão do tempo"                  
-    ]
+    )
     
     with st.spinner("Processando dados e inferências estatísticas..."):
         # 1. Busca
@@ -232,38 +324,29 @@ if st.button("🔎 INICIAR PROTOCOLO SENTINELA", type="primary"):
         if is_simulated:
             st.warning("⚠️ FAILOVER ATIVO: Usando dados sintéticos para demonstração.")
 
-        # 2. Matemáticas
+        # 2. Matemáticas (cacheadas: reexecuções com o mesmo df_raw não recalculam)
         win_size = math.definir_janela_adaptativa(janela_analise)
-        df_smooth = math.aplicar_media_movel_retrospectiva(df_raw, janela=win_size)
-        
-        c_alvo = f"{termos[0]}_smooth"
-        c_clinico = f"{termos[1]}_smooth"
+        resultado = math.executar_pipeline(df_raw, termos, win_size)
         
-        # Baseline Robusto (Shifted)
-        threshold, trend = math.calcular_limiar_robusto_mad(df_raw[termos[0]], win_size)
-        df_smooth['threshold'] = threshold
+        df_smooth = resultado['df_smooth']
+        lag_dias, lag_corr, p_val = resultado['lag_dias'], resultado['lag_corr'], resultado['p_val']
+        vero_idx = resultado['vero_idx']
         
-        # Lag
-        lag_dias, lag_corr, p_val = math.calcular_detrended_lag_significancia(df_raw[termos[0]], df_raw[termos[1]])
+        c_alvo = f"{termos[0]}_smooth"
         
-        # Vero-Index
-        c_ruido = f"{termos[3]}_smooth"
-        c_controle = f"{termos[4]}_smooth"
-        vero_idx = math.calcular_vero_index_robusto(
-            df_smooth[c_clinico].iloc[-1],
-            df_smooth[c_ruido].iloc[-1],
-            df_smooth[c_controle].iloc[-1]
-        )
+        # Última observação (uma única extração de linha para todos os KPIs)
+        ultimo = df_smooth.iloc[-1]
+        val_google = ultimo[c_alvo]
+        val_limiar = ultimo['threshold']
         
         # Impacto KSU
-        val_google = df_smooth[c_alvo].iloc[-1]
         impacto_ksu, pop_con = demo.calcular_impacto_proxy(val_google, input_uf)
 
     # --- RESULTADOS ---
     st.divider()
     
     k1, k2, k3, k4 = st.columns(4)
-    status_surto = val_google > threshold.iloc[-1]
+    status_surto = val_google > val_limiar
     
     k1.metric(
         "Impacto Estimado (Proxy)",
@@ -275,7 +358,7 @@ if st.button("🔎 INICIAR PROTOCOLO SENTINELA", type="primary"):
     k2.metric(
         "Status Sentinela",
         "ALERTA" if status_surto else "BASAL",
-        f"{(val_google - threshold.iloc[-1]):.1f} pts (vs Limiar)",
+        f"{(val_google - val_limiar):.1f} pts (vs Limiar)",
         delta_color="inverse"
     )
     
@@ -297,11 +380,16 @@ if st.button("🔎 INICIAR PROTOCOLO SENTINELA", type="primary"):
     # GRÁFICO CORRIGIDO (PLOTLY LAYERING)
     st.subheader("📉 Monitoramento de Limiar Robusto (MAD Shifted)")
     
+    # Eixo X serializado uma única vez (ISO) e séries em float32: payload JSON menor
+    x_datas = df_smooth.index.strftime('%Y-%m-%d').to_numpy()
+    y_alvo = df_smooth[c_alvo].to_numpy(dtype=np.float32)
+    y_limiar = df_smooth['threshold'].to_numpy(dtype=np.float32)
+    
     fig = go.Figure()
     
     # Camada 1: Limiar (Base)
     fig.add_trace(go.Scatter(
-        x=df_smooth.index, y=df_smooth['threshold'],
+        x=x_datas, y=y_limiar,
         mode='lines', name='Limiar (Mediana + 3 MAD)',
         line=dict(color=C_LIMIAR, dash='dash', width=2)
     ))
@@ -309,10 +397,10 @@ if st.button("🔎 INICIAR PROTOCOLO SENTINELA", type="primary"):
     # Camada 2: Excesso (Área de Alerta)
     # Lógica: Criamos uma linha que é o MÁXIMO entre o Sinal e o Limiar.
     # Ao preencher "tonexty" (para baixo, até o Limiar), pintamos apenas o excesso.
-    y_top = np.maximum(df_smooth[c_alvo], df_smooth['threshold'])
+    y_top = np.maximum(y_alvo, y_limiar)
     
     fig.add_trace(go.Scatter(
-        x=df_smooth.index, y=y_top,
+        x=x_datas, y=y_top,
         mode='lines', line=dict(width=0), # Linha invisível
         fill='tonexty', # Preenche até o Trace anterior (Limiar)
         fillcolor=C_FILL,
@@ -322,7 +410,7 @@ if st.button("🔎 INICIAR PROTOCOLO SENTINELA", type="primary"):
     
     # Camada 3: Sinal (Topo)
     fig.add_trace(go.Scatter(
-        x=df_smooth.index, y=df_smooth[c_alvo],
+        x=x_datas, y=y_alvo,
         mode='lines', name='Volume Sentinela',
         line=dict(color=C_ALVO, width=3)
     ))
@@ -346,6 +434,6 @@ if st.button("🔎 INICIAR PROTOCOLO SENTINELA", type="primary"):
         st.markdown("### 📥 Auditoria")
         st.download_button(
             "Baixar Relatório (CSV)",
-            df_raw.to_csv().encode('utf-8'),
+            AuditExporter.gerar_csv(df_raw),
             f"svei_audit_{datetime.now().date()}.csv"
         )